@@ -1,10 +1,16 @@
-import io
+import asyncio
+import itertools
 import logging
+import sys
+import weakref
+from typing import Any
 
 import google.auth
 import google.auth.transport.requests
 import grpc
 import pyarrow as pa
+import pyarrow.compute as pc
+from cachetools import TTLCache
 from google.oauth2 import id_token
 
 from .analysis_pb2 import (
@@ -18,145 +24,247 @@ from .analysis_pb2_grpc import AnalysisServiceStub
 
 logger = logging.getLogger(__name__)
 
+try:
+    _MEMORY_POOL = pa.jemalloc_memory_pool()
+except NotImplementedError:
+    _MEMORY_POOL = pa.default_memory_pool()
+
+
+def _column_to_pylist(column: pa.ChunkedArray) -> list[Any]:
+    try:
+        return column.to_pylist()
+    except (ValueError, OverflowError):
+        return pc.cast(column, pa.string()).to_pylist()
+
 
 class QueryResult:
     def __init__(
         self,
-        rows: list[dict[str, str]],
+        column_chunks: list[list[list[Any]]],
         column_names: list[str],
         total_rows: int,
         execution_time_ms: int,
+        arrow_ipc_data: bytes | None = None,
     ):
-        self.rows = rows
+        self.column_chunks = column_chunks
         self.column_names = column_names
         self.total_rows = total_rows
         self.execution_time_ms = execution_time_ms
+        self.arrow_ipc_data = arrow_ipc_data
+
+
+_CHANNEL_OPTIONS = [
+    ("grpc.max_receive_message_length", 64 << 20),
+    ("grpc.keepalive_time_ms", 30_000),
+    ("grpc.keepalive_timeout_ms", 10_000),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.http2.min_time_between_pings_ms", 10_000),
+    ("grpc.use_local_subchannel_pool", 1),
+]
+_CHANNEL_POOL_SIZE = 4
+_LOOKUP_TIMEOUT_S = 10.0
+_CHANNEL_CACHE: dict[tuple[str, bool], list[grpc.aio.Channel]] = {}
+
+
+def _create_channels(endpoint: str, use_ssl: bool) -> list[grpc.aio.Channel]:
+    if use_ssl:
+        ssl_credentials = grpc.ssl_channel_credentials()
+        auth_req = google.auth.transport.requests.Request()
+        target_audience = f"https://{endpoint}"
+        token = id_token.fetch_id_token(auth_req, target_audience)
+
+        call_credentials = grpc.access_token_call_credentials(token)
+        composite_credentials = grpc.composite_channel_credentials(
+            ssl_credentials, call_credentials
+        )
+        return [
+            grpc.aio.secure_channel(endpoint, composite_credentials, options=_CHANNEL_OPTIONS)
+            for _ in range(_CHANNEL_POOL_SIZE)
+        ]
+    return [
+        grpc.aio.insecure_channel(endpoint, options=_CHANNEL_OPTIONS)
+        for _ in range(_CHANNEL_POOL_SIZE)
+    ]
+
+
+def _get_channels(endpoint: str, use_ssl: bool) -> list[grpc.aio.Channel]:
+    key = (endpoint, use_ssl)
+    if key not in _CHANNEL_CACHE:
+        _CHANNEL_CACHE[key] = _create_channels(endpoint, use_ssl)
+    return _CHANNEL_CACHE[key]
 
 
 class QueryEngineClient:
     def __init__(self, endpoint: str):
         self.endpoint = endpoint.replace("https://", "").replace("http://", "")
         self.use_ssl = "https://" in endpoint or ":443" in endpoint
-        self._channel = None
-        self._stub = None
+        self._stubs = None
+        self._datasets_cache: TTLCache = TTLCache(maxsize=1, ttl=10)
+        self._datasets_lock = asyncio.Lock()
+        self._metadata_cache: TTLCache = TTLCache(maxsize=256, ttl=60)
+        self._metadata_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
 
     @property
-    def channel(self):
-        if self._channel is None:
-            if self.use_ssl:
-                ssl_credentials = grpc.ssl_channel_credentials()
-                auth_req = google.auth.transport.requests.Request()
-                target_audience = f"https://{self.endpoint}"
-                token = id_token.fetch_id_token(auth_req, target_audience)
-
-                call_credentials = grpc.access_token_call_credentials(token)
-                composite_credentials = grpc.composite_channel_credentials(
-                    ssl_credentials, call_credentials
-                )
-                self._channel = grpc.aio.secure_channel(self.endpoint, composite_credentials)
-            else:
-                self._channel = grpc.aio.insecure_channel(self.endpoint)
-        return self._channel
+    def channels(self) -> list[grpc.aio.Channel]:
+        return _get_channels(self.endpoint, self.use_ssl)
 
     @property
-    def stub(self):
-        if self._stub is None:
-            self._stub = AnalysisServiceStub(self.channel)
-        return self._stub
+    def stub(self) -> AnalysisServiceStub:
+        if self._stubs is None:
+            self._stubs = itertools.cycle(
+                [AnalysisServiceStub(channel) for channel in self.channels]
+            )
+        return next(self._stubs)
 
     async def close(self) -> None:
-        if self._channel:
-            await self._channel.close()
-            self._channel = None
-            self._stub = None
+        self._stubs = None
 
     async def list_datasets(self) -> list[Dataset]:
-        request = ListDatasetsRequest()
-        response = await self.stub.ListDatasets(request)
-        return list(response.datasets)
+        async with self._datasets_lock:
+            datasets = self._datasets_cache.get("datasets")
+            if datasets is None:
+                request = ListDatasetsRequest()
+                response = await self.stub.ListDatasets(request, timeout=_LOOKUP_TIMEOUT_S)
+                datasets = list(response.datasets)
+                self._datasets_cache["datasets"] = datasets
+            return datasets
 
     async def get_metadata(self, dataset_id: str) -> DatasetMetadata | None:
-        request = GetMetadataRequest(dataset_id=dataset_id)
-        response = await self.stub.GetMetadata(request)
-        return response.metadata if response.HasField("metadata") else None
+        lock = self._metadata_locks.setdefault(dataset_id, asyncio.Lock())
+        async with lock:
+            metadata = self._metadata_cache.get(dataset_id)
+            if metadata is None:
+                request = GetMetadataRequest(dataset_id=dataset_id)
+                response = await self.stub.GetMetadata(request, timeout=_LOOKUP_TIMEOUT_S)
+                if not response.HasField("metadata"):
+                    return None
+                metadata = response.metadata
+                self._metadata_cache[dataset_id] = metadata
+            return metadata
 
     async def execute_query(
-        self, dataset_id: str, sql_query: str, limit: int | None = None
+        self,
+        dataset_id: str,
+        sql_query: str,
+        limit: int | None = None,
+        result_format: str = "json",
     ) -> QueryResult:
         request = ExecuteQueryRequest(
             dataset_id=dataset_id, sql_query=sql_query, limit=limit or 1000
         )
 
-        all_rows = []
+        conversions = []
+        arrow_chunks = []
         column_names = []
+        schema = None
         total_execution_time = 0
 
-        stream = self.stub.ExecuteQuery(request)
+        stream = self.stub.ExecuteQuery(request, compression=grpc.Compression.Gzip)
         async for response in stream:
-            if response.HasField("metadata"):
-                column_names = list(response.metadata.column_names)
-                logger.info(f"Received metadata with {len(column_names)} columns")
-
-            elif response.HasField("data_chunk"):
-                chunk_rows = self._convert_arrow_ipc_to_rows(
-                    response.data_chunk.arrow_ipc_data, column_names
-                )
-                all_rows.extend(chunk_rows)
-                logger.info(f"Processed chunk with {response.data_chunk.chunk_rows} rows")
-
-            elif response.HasField("complete"):
+            kind = response.WhichOneof("response_type")
+            if kind == "metadata":
+                column_names = [sys.intern(name) for name in response.metadata.column_names]
+                schema = pa.ipc.read_schema(pa.py_buffer(response.metadata.arrow_schema))
+                logger.info("Received metadata with %d columns", len(column_names))
+
+            elif kind == "data_chunk":
+                if result_format == "arrow":
+                    arrow_chunks.append(response.data_chunk.arrow_ipc_data)
+                else:
+                    conversions.append(
+                        asyncio.create_task(
+                            asyncio.to_thread(
+                                self._convert_arrow_ipc_to_columns,
+                                response.data_chunk.arrow_ipc_data,
+                                schema,
+                            )
+                        )
+                    )
+                logger.info("Processed chunk with %d rows", response.data_chunk.chunk_rows)
+
+            elif kind == "complete":
                 try:
                     total_execution_time = int(response.complete.execution_time_ms)
                 except ValueError:
                     total_execution_time = 0
-                logger.info(f"Query completed in {total_execution_time}ms")
+                logger.info("Query completed in %dms", total_execution_time)
                 break
 
+        if result_format == "arrow":
+            arrow_ipc_data, total_rows = await asyncio.to_thread(
+                self._concat_arrow_ipc, arrow_chunks, schema
+            )
+            return QueryResult(
+                column_chunks=[],
+                column_names=column_names,
+                total_rows=total_rows,
+                execution_time_ms=total_execution_time,
+                arrow_ipc_data=arrow_ipc_data,
+            )
+
+        column_chunks = [chunk for chunk in await asyncio.gather(*conversions) if chunk]
+
         return QueryResult(
-            rows=all_rows,
+            column_chunks=column_chunks,
             column_names=column_names,
-            total_rows=len(all_rows),
+            total_rows=sum(len(chunk[0]) for chunk in column_chunks),
             execution_time_ms=total_execution_time,
         )
 
-    def _convert_arrow_ipc_to_rows(
-        self, arrow_data: bytes, column_names: list[str]
-    ) -> list[dict[str, str]]:
+    def _read_batches(self, arrow_data: bytes, schema: pa.Schema) -> list[pa.RecordBatch]:
+        buffer = pa.py_buffer(arrow_data)
+        messages = [
+            message
+            for message in pa.ipc.MessageReader.open_stream(pa.BufferReader(buffer))
+            if message.type != "schema"
+        ]
+        if any(message.type == "dictionary" for message in messages):
+            return list(pa.ipc.open_stream(pa.BufferReader(buffer), memory_pool=_MEMORY_POOL))
+        return [pa.ipc.read_record_batch(message, schema) for message in messages]
+
+    def _convert_arrow_ipc_to_columns(
+        self, arrow_data: bytes, schema: pa.Schema
+    ) -> list[list[Any]]:
         logger.info(
-            f"Converting Arrow IPC data ({len(arrow_data)} bytes) to rows "
-            f"for {len(column_names)} columns"
+            "Converting Arrow IPC data (%d bytes) to columns for %d columns",
+            len(arrow_data),
+            len(schema),
         )
 
         if not arrow_data:
             return []
 
         try:
-            reader = pa.ipc.open_stream(io.BytesIO(arrow_data))
-            all_rows = []
-
-            for batch in reader:
-                for row_idx in range(batch.num_rows):
-                    row = {}
-                    for col_idx, column_name in enumerate(column_names):
-                        if col_idx < batch.num_columns:
-                            column = batch.column(col_idx)
-                            value = self._extract_arrow_value_as_string(column, row_idx)
-                            row[column_name] = value
-                    all_rows.append(row)
-
-            logger.info(f"Successfully converted Arrow IPC data to {len(all_rows)} rows")
-            return all_rows
+            table = pa.Table.from_batches(
+                self._read_batches(arrow_data, schema), schema=schema
+            ).combine_chunks(memory_pool=_MEMORY_POOL)
+            columns = [_column_to_pylist(column) for column in table.columns]
+
+            logger.info("Successfully converted Arrow IPC data to %d rows", table.num_rows)
+            return columns
 
         except Exception as e:
             logger.error(f"Failed to convert Arrow IPC data: {e}")
             return []
 
-    def _extract_arrow_value_as_string(self, column: pa.Array, index: int) -> str:
-        try:
-            value = column[index].as_py()
-            return str(value) if value is not None else "NULL"
-        except Exception:
-            return "NULL"
+    def _concat_arrow_ipc(
+        self, arrow_chunks: list[bytes], schema: pa.Schema | None
+    ) -> tuple[bytes, int]:
+        if schema is None:
+            return b"", 0
+
+        sink = pa.BufferOutputStream(memory_pool=_MEMORY_POOL)
+        total_rows = 0
+
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for arrow_data in arrow_chunks:
+                for batch in self._read_batches(arrow_data, schema):
+                    writer.write_batch(batch)
+                    total_rows += batch.num_rows
+
+        return sink.getvalue().to_pybytes(), total_rows
 
     async def health_check(self) -> bool:
         try:
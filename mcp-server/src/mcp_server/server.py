@@ -1,9 +1,12 @@
-import json
+import base64
+import io
 import logging
 import os
 import sys
 import time
+from typing import Any, Literal
 
+import orjson
 from fastmcp import FastMCP
 from pydantic import BaseModel
 
@@ -16,6 +19,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 query_engine_endpoint = os.getenv("QUERY_ENGINE_ENDPOINT", "http://localhost:50051")
+json_dump_option = orjson.OPT_INDENT_2 if os.getenv("MCP_PRETTY_JSON") else 0
 
 
 class GetMetadataRequest(BaseModel):
@@ -26,6 +30,7 @@ class ExecuteQueryRequest(BaseModel):
     dataset_id: str
     sql_query: str
     limit: int | None = None
+    result_format: Literal["json", "arrow", "ndjson"] = "json"
 
 
 class VsCodeDataset(BaseModel):
@@ -50,6 +55,42 @@ class AnalysisService:
             await self.query_client.close()
 
 
+def _encode_columns(
+    column_names: list[str], column_chunks: list[list[list[Any]]]
+) -> orjson.Fragment:
+    buffer = io.BytesIO()
+    buffer.write(b"{")
+    for index, name in enumerate(column_names):
+        if index:
+            buffer.write(b",")
+        buffer.write(orjson.dumps(name))
+        buffer.write(b":[")
+        buffer.write(
+            b",".join(
+                orjson.dumps(chunk[index], default=str)[1:-1]
+                for chunk in column_chunks
+                if chunk[index]
+            )
+        )
+        buffer.write(b"]")
+    buffer.write(b"}")
+    return orjson.Fragment(buffer.getvalue())
+
+
+def _encode_ndjson_rows(column_names: list[str], column_chunks: list[list[list[Any]]]) -> str:
+    buffer = io.BytesIO()
+    for chunk in column_chunks:
+        for row in zip(*chunk):
+            buffer.write(
+                orjson.dumps(
+                    dict(zip(column_names, row)),
+                    default=str,
+                    option=orjson.OPT_APPEND_NEWLINE,
+                )
+            )
+    return buffer.getvalue().decode()
+
+
 mcp = FastMCP("Analysis MCP Server")
 service = AnalysisService(query_engine_endpoint)
 
@@ -186,18 +227,21 @@ async def list_datasets() -> str:
                     "updated_at": dataset.updated_at,
                 }
             )
-        elapsed_ms = (time.time() - start_time) * 1000
-        logger.info(
-            "list_datasets completed successfully",
-            extra={"dataset_count": len(datasets_dict), "elapsed_ms": elapsed_ms},
-        )
-        return json.dumps(datasets_dict, indent=2)
+        if logger.isEnabledFor(logging.INFO):
+            elapsed_ms = (time.time() - start_time) * 1000
+            logger.info(
+                "list_datasets completed successfully",
+                extra={"dataset_count": len(datasets_dict), "elapsed_ms": elapsed_ms},
+            )
+        return orjson.dumps(datasets_dict, option=json_dump_option).decode()
     except Exception as e:
         elapsed_ms = (time.time() - start_time) * 1000
         logger.error(
             "list_datasets failed", extra={"elapsed_ms": elapsed_ms, "error": str(e)}, exc_info=True
         )
-        return json.dumps({"error": "Failed to retrieve datasets. Please try again later."})
+        return orjson.dumps(
+            {"error": "Failed to retrieve datasets. Please try again later."}
+        ).decode()
 
 
 @mcp.tool()
@@ -205,8 +249,9 @@ async def get_metadata(params: GetMetadataRequest) -> str:
     """Get metadata for a specific dataset"""
     start_time = time.time()
     try:
-        logger.info(f"get_metadata called with params: {params.model_dump()}")
-        logger.info("Starting get_metadata request", extra={"dataset_id": params.dataset_id})
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("get_metadata called with params: %s", params.model_dump())
+            logger.info("Starting get_metadata request", extra={"dataset_id": params.dataset_id})
         metadata = await service.query_client.get_metadata(params.dataset_id)
         if not metadata:
             elapsed_ms = (time.time() - start_time) * 1000
@@ -214,7 +259,7 @@ async def get_metadata(params: GetMetadataRequest) -> str:
                 "get_metadata dataset not found",
                 extra={"dataset_id": params.dataset_id, "elapsed_ms": elapsed_ms},
             )
-            return json.dumps({"error": f"Dataset not found: {params.dataset_id}"})
+            return orjson.dumps({"error": f"Dataset not found: {params.dataset_id}"}).decode()
 
         metadata_dict = {
             "id": metadata.id,
@@ -238,17 +283,18 @@ async def get_metadata(params: GetMetadataRequest) -> str:
             ],
             "statistics": dict(metadata.statistics),
         }
-        elapsed_ms = (time.time() - start_time) * 1000
-        logger.info(
-            "get_metadata completed successfully",
-            extra={
-                "dataset_id": params.dataset_id,
-                "column_count": len(metadata.columns),
-                "row_count": metadata.row_count,
-                "elapsed_ms": elapsed_ms,
-            },
-        )
-        return json.dumps(metadata_dict, indent=2)
+        if logger.isEnabledFor(logging.INFO):
+            elapsed_ms = (time.time() - start_time) * 1000
+            logger.info(
+                "get_metadata completed successfully",
+                extra={
+                    "dataset_id": params.dataset_id,
+                    "column_count": len(metadata.columns),
+                    "row_count": metadata.row_count,
+                    "elapsed_ms": elapsed_ms,
+                },
+            )
+        return orjson.dumps(metadata_dict, option=json_dump_option).decode()
     except Exception as e:
         elapsed_ms = (time.time() - start_time) * 1000
         logger.error(
@@ -256,44 +302,62 @@ async def get_metadata(params: GetMetadataRequest) -> str:
             extra={"dataset_id": params.dataset_id, "elapsed_ms": elapsed_ms, "error": str(e)},
             exc_info=True,
         )
-        return json.dumps({"error": "Failed to retrieve dataset metadata. Please try again later."})
+        return orjson.dumps(
+            {"error": "Failed to retrieve dataset metadata. Please try again later."}
+        ).decode()
 
 
 @mcp.tool()
 async def execute_query(params: ExecuteQueryRequest) -> str:
     """Execute a SQL query on a dataset.
     IMPORTANT: Use the dataset_id as the table name in your FROM clause.
-    Example: SELECT * FROM "dataset-id-here" LIMIT 10"""
+    Example: SELECT * FROM "dataset-id-here" LIMIT 10
+    Set result_format to "arrow" to receive the result as a base64 Arrow IPC stream,
+    or to "ndjson" to receive one JSON object per row."""
     start_time = time.time()
     try:
-        logger.info(f"execute_query called with params: {params.model_dump()}")
-        logger.info(f"SQL query: {params.sql_query}")
-        logger.info(
-            "Starting execute_query request",
-            extra={"dataset_id": params.dataset_id, "limit": params.limit},
-        )
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("execute_query called with params: %s", params.model_dump())
+            logger.info("SQL query: %s", params.sql_query)
+            logger.info(
+                "Starting execute_query request",
+                extra={"dataset_id": params.dataset_id, "limit": params.limit},
+            )
         result = await service.query_client.execute_query(
-            params.dataset_id, params.sql_query, params.limit
+            params.dataset_id, params.sql_query, params.limit, params.result_format
         )
 
-        response = {
-            "rows": result.rows,
-            "column_names": result.column_names,
-            "total_rows": result.total_rows,
-            "execution_time_ms": result.execution_time_ms,
-        }
-        elapsed_ms = (time.time() - start_time) * 1000
-        logger.info(
-            "execute_query completed successfully",
-            extra={
-                "dataset_id": params.dataset_id,
-                "row_count": result.total_rows,
-                "column_count": len(result.column_names),
-                "query_execution_ms": result.execution_time_ms,
-                "total_elapsed_ms": elapsed_ms,
-            },
-        )
-        return json.dumps(response, indent=2)
+        if params.result_format == "arrow":
+            response = {
+                "arrow_ipc_b64": base64.b64encode(result.arrow_ipc_data).decode(),
+                "column_names": result.column_names,
+                "total_rows": result.total_rows,
+                "execution_time_ms": result.execution_time_ms,
+            }
+            output = orjson.dumps(response, option=json_dump_option).decode()
+        elif params.result_format == "ndjson":
+            output = _encode_ndjson_rows(result.column_names, result.column_chunks)
+        else:
+            response = {
+                "columns": _encode_columns(result.column_names, result.column_chunks),
+                "column_names": result.column_names,
+                "total_rows": result.total_rows,
+                "execution_time_ms": result.execution_time_ms,
+            }
+            output = orjson.dumps(response, option=json_dump_option).decode()
+        if logger.isEnabledFor(logging.INFO):
+            elapsed_ms = (time.time() - start_time) * 1000
+            logger.info(
+                "execute_query completed successfully",
+                extra={
+                    "dataset_id": params.dataset_id,
+                    "row_count": result.total_rows,
+                    "column_count": len(result.column_names),
+                    "query_execution_ms": result.execution_time_ms,
+                    "total_elapsed_ms": elapsed_ms,
+                },
+            )
+        return output
     except Exception as e:
         elapsed_ms = (time.time() - start_time) * 1000
         error_message = str(e)
@@ -306,7 +370,7 @@ async def execute_query(params: ExecuteQueryRequest) -> str:
             },
             exc_info=True,
         )
-        return json.dumps({"error": f"Query execution failed: {error_message}"})
+        return orjson.dumps({"error": f"Query execution failed: {error_message}"}).decode()
 
 
 def run_server() -> None:
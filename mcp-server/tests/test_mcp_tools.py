@@ -0,0 +1,135 @@
+import re
+from contextlib import asynccontextmanager
+
+import httpx
+import orjson
+import pytest
+
+from src.mcp_server import server
+from src.mcp_server.analysis_pb2 import ColumnInfo, Dataset, DatasetMetadata
+from src.mcp_server.query_client import QueryResult
+
+_SSE_DATA = re.compile(rb"^data: (.*)$", re.M)
+
+
+class _QueryClientStub:
+    def __init__(self):
+        self.queries = []
+
+    async def list_datasets(self):
+        return [Dataset(id="sales", name="Sales", tags=["finance"])]
+
+    async def get_metadata(self, dataset_id):
+        if dataset_id != "sales":
+            return None
+        return DatasetMetadata(
+            id="sales",
+            name="Sales",
+            columns=[ColumnInfo(name="amount", data_type="Int64", nullable=True)],
+        )
+
+    async def execute_query(self, dataset_id, sql_query, limit=None, result_format="json"):
+        self.queries.append((dataset_id, sql_query, limit, result_format))
+        return QueryResult(
+            column_chunks=[[[1, 2], ["a", None]], [[3], ["c"]]],
+            column_names=["amount", "label"],
+            total_rows=3,
+            execution_time_ms=4,
+        )
+
+
+@pytest.fixture
+def query_client(monkeypatch):
+    stub = _QueryClientStub()
+    monkeypatch.setattr(server.service, "query_client", stub)
+    return stub
+
+
+@asynccontextmanager
+async def _mcp_client():
+    app = server.mcp.http_app(path="/mcp", stateless_http=True)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://localhost",
+            headers={
+                "Content-Type": "application/json",
+                "Accept": "application/json, text/event-stream",
+            },
+        ) as client:
+            yield client
+
+
+async def _call_tool(client, name, arguments):
+    response = await client.post(
+        "/mcp",
+        content=orjson.dumps(
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "tools/call",
+                "params": {"name": name, "arguments": arguments},
+            }
+        ),
+    )
+    assert response.status_code == 200, response.text
+    result = orjson.loads(_SSE_DATA.search(response.content).group(1))
+    return orjson.loads(result["result"]["content"][0]["text"])
+
+
+@pytest.mark.asyncio
+async def test_list_datasets_tool(query_client):
+    # Given a query engine serving one dataset
+
+    # When the list_datasets tool is called over MCP
+    async with _mcp_client() as client:
+        datasets = await _call_tool(client, "list_datasets", {})
+
+    # Then the dataset is returned with its fields
+    assert [dataset["id"] for dataset in datasets] == ["sales"]
+    assert datasets[0]["name"] == "Sales"
+    assert datasets[0]["tags"] == ["finance"]
+
+
+@pytest.mark.asyncio
+async def test_get_metadata_tool(query_client):
+    # Given a query engine serving metadata for the sales dataset
+
+    # When the get_metadata tool is called for known and unknown datasets
+    async with _mcp_client() as client:
+        metadata = await _call_tool(client, "get_metadata", {"params": {"dataset_id": "sales"}})
+        missing = await _call_tool(client, "get_metadata", {"params": {"dataset_id": "other"}})
+
+    # Then the columns are returned for the known dataset and an error for the unknown one
+    assert metadata["columns"] == [
+        {
+            "name": "amount",
+            "data_type": "Int64",
+            "nullable": True,
+            "description": "",
+            "statistics": {},
+        }
+    ]
+    assert missing == {"error": "Dataset not found: other"}
+
+
+@pytest.mark.asyncio
+async def test_execute_query_tool(query_client):
+    # Given a query engine returning two chunks of columnar results
+
+    # When the execute_query tool is called over MCP
+    async with _mcp_client() as client:
+        result = await _call_tool(
+            client,
+            "execute_query",
+            {"params": {"dataset_id": "sales", "sql_query": 'SELECT * FROM "sales"', "limit": 3}},
+        )
+
+    # Then the query is forwarded and the chunks are merged into columns
+    assert query_client.queries == [("sales", 'SELECT * FROM "sales"', 3, "json")]
+    assert result == {
+        "columns": {"amount": [1, 2, 3], "label": ["a", None, "c"]},
+        "column_names": ["amount", "label"],
+        "total_rows": 3,
+        "execution_time_ms": 4,
+    }
@@ -1,18 +1,33 @@
-from unittest.mock import MagicMock, patch
+import itertools
+from decimal import Decimal
+from types import SimpleNamespace
 
+import orjson
+import pyarrow as pa
 import pytest
 
+from src.mcp_server.analysis_pb2 import (
+    DatasetMetadata,
+    ExecuteQueryResponse,
+    GetMetadataResponse,
+    QueryComplete,
+    QueryDataChunk,
+    QueryMetadata,
+)
 from src.mcp_server.query_client import QueryEngineClient
-from src.mcp_server.server import AnalysisService
+from src.mcp_server.server import AnalysisService, _encode_columns, _encode_ndjson_rows
+
+
+class _QC:
+    async def close(self):
+        pass
 
 
 @pytest.mark.asyncio
-@patch("src.mcp_server.server.service")
-async def test_basic_service_functionality(mock_service):
-    """Test basic service functionality by mocking the service directly"""
-    # Mock the query client
-    mock_query_client = MagicMock()
-    mock_service.query_client = mock_query_client
+async def test_basic_service_functionality(monkeypatch):
+    """Test basic service functionality by stubbing the service directly"""
+    # Stub the module-level service
+    monkeypatch.setattr("src.mcp_server.server.service", SimpleNamespace(query_client=_QC()))
 
     # Test that we can create the service without errors
     service = AnalysisService("http://test:50051")
@@ -50,13 +65,13 @@ def test_query_result():
     from src.mcp_server.query_client import QueryResult
 
     result = QueryResult(
-        rows=[{"col1": "value1", "col2": "value2"}],
+        column_chunks=[[["value1"], ["value2"]]],
         column_names=["col1", "col2"],
         total_rows=1,
         execution_time_ms=100,
     )
 
-    assert len(result.rows) == 1
+    assert result.column_chunks == [[["value1"], ["value2"]]]
     assert result.column_names == ["col1", "col2"]
     assert result.total_rows == 1
     assert result.execution_time_ms == 100
@@ -70,3 +85,202 @@ async def test_query_engine_client_initialization():
 
     # Test close method exists
     await client.close()
+
+
+def _arrow_ipc_bytes(table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class _StreamingStub:
+    def __init__(self, responses):
+        self.responses = responses
+
+    def ExecuteQuery(self, request, compression=None):  # noqa: N802
+        async def stream():
+            for response in self.responses:
+                yield response
+
+        return stream()
+
+
+class _MetadataStub:
+    def __init__(self):
+        self.calls = 0
+        self.timeouts = []
+
+    async def GetMetadata(self, request, timeout=None):  # noqa: N802
+        self.calls += 1
+        self.timeouts.append(timeout)
+        return GetMetadataResponse(metadata=DatasetMetadata(id=request.dataset_id))
+
+
+@pytest.mark.asyncio
+async def test_get_metadata_is_cached_per_dataset():
+    # Given a query engine serving dataset metadata
+    stub = _MetadataStub()
+    client = QueryEngineClient("http://test:50051")
+    client._stubs = itertools.cycle([stub])
+
+    # When the same dataset is requested twice and another dataset once
+    first = await client.get_metadata("dataset-a")
+    second = await client.get_metadata("dataset-a")
+    other = await client.get_metadata("dataset-b")
+
+    # Then the engine is only called once per dataset with a deadline and no lock is retained
+    assert first.id == second.id == "dataset-a"
+    assert other.id == "dataset-b"
+    assert stub.calls == 2
+    assert all(timeout is not None for timeout in stub.timeouts)
+    assert len(client._metadata_locks) == 0
+
+
+def _query_stream(*tables) -> list[ExecuteQueryResponse]:
+    schema = tables[0].schema
+    sink = pa.BufferOutputStream()
+    pa.ipc.new_stream(sink, schema).close()
+    return [
+        ExecuteQueryResponse(
+            metadata=QueryMetadata(
+                arrow_schema=sink.getvalue().to_pybytes(), column_names=schema.names
+            )
+        ),
+        *(
+            ExecuteQueryResponse(
+                data_chunk=QueryDataChunk(
+                    arrow_ipc_data=_arrow_ipc_bytes(table), chunk_rows=table.num_rows
+                )
+            )
+            for table in tables
+        ),
+        ExecuteQueryResponse(complete=QueryComplete(execution_time_ms="12", success=True)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_execute_query_collects_columns_across_chunks():
+    # Given a query engine streaming two data chunks
+    client = QueryEngineClient("http://test:50051")
+    client._stubs = itertools.cycle(
+        [_StreamingStub(_query_stream(pa.table({"id": [1, 2]}), pa.table({"id": [3]})))]
+    )
+
+    # When executing the query
+    result = await client.execute_query("dataset", "SELECT id FROM dataset")
+
+    # Then the chunks are kept in order
+    assert result.column_chunks == [[[1, 2]], [[3]]]
+    assert result.column_names == ["id"]
+    assert result.total_rows == 3
+    assert result.execution_time_ms == 12
+
+
+def test_convert_arrow_ipc_to_columns():
+    # Given an Arrow IPC stream with a null value
+    table = pa.table({"id": [1, 2], "name": ["a", None]})
+    client = QueryEngineClient("http://test:50051")
+
+    # When converting it to columns
+    columns = client._convert_arrow_ipc_to_columns(_arrow_ipc_bytes(table), table.schema)
+
+    # Then values keep their types and nulls become None
+    assert columns == [[1, 2], ["a", None]]
+
+
+@pytest.mark.asyncio
+async def test_execute_query_keeps_chunks_with_unconvertible_values():
+    # Given a chunk whose timestamp column holds a value Python cannot represent
+    table = pa.table({"id": [1, 2], "at": pa.array([10**12, 0], pa.timestamp("s"))})
+    client = QueryEngineClient("http://test:50051")
+    client._stubs = itertools.cycle([_StreamingStub(_query_stream(table))])
+
+    # When executing the query
+    result = await client.execute_query("dataset", "SELECT * FROM dataset")
+
+    # Then the chunk is kept, only that column falls back to strings and every row is counted
+    assert result.total_rows == 2
+    assert result.column_chunks[0][0] == [1, 2]
+    assert result.column_chunks[0][1][1] == "1970-01-01 00:00:00"
+    assert len(result.column_chunks[0][1]) == 2
+
+
+def test_convert_arrow_ipc_to_columns_merges_batches_in_a_chunk():
+    # Given a chunk holding two record batches
+    table = pa.Table.from_batches([pa.record_batch({"id": [1, 2]}), pa.record_batch({"id": [3]})])
+    client = QueryEngineClient("http://test:50051")
+
+    # When converting it to columns
+    columns = client._convert_arrow_ipc_to_columns(_arrow_ipc_bytes(table), table.schema)
+
+    # Then each column holds the values of every batch
+    assert columns == [[1, 2, 3]]
+
+
+def test_concat_arrow_ipc_merges_chunks_into_one_stream():
+    # Given two Arrow IPC chunks as streamed by the query engine
+    first = pa.table({"id": [1, 2]})
+    second = pa.table({"id": [3]})
+    client = QueryEngineClient("http://test:50051")
+
+    # When concatenating them
+    arrow_ipc_data, total_rows = client._concat_arrow_ipc(
+        [_arrow_ipc_bytes(first), _arrow_ipc_bytes(second)], first.schema
+    )
+
+    # Then a single stream holds every row
+    assert total_rows == 3
+    assert pa.ipc.open_stream(arrow_ipc_data).read_all().column("id").to_pylist() == [1, 2, 3]
+
+
+def test_read_batches_decodes_dictionary_encoded_chunks():
+    # Given a chunk whose column is dictionary encoded
+    table = pa.table({"city": pa.array(["x", "y", "x"]).dictionary_encode()})
+    client = QueryEngineClient("http://test:50051")
+
+    # When reading its batches against the stream schema
+    batches = client._read_batches(_arrow_ipc_bytes(table), table.schema)
+
+    # Then the dictionary values are resolved
+    assert pa.Table.from_batches(batches).column("city").to_pylist() == ["x", "y", "x"]
+
+
+@pytest.mark.asyncio
+async def test_query_engine_clients_share_channel_pool_per_endpoint():
+    # Given two clients for the same endpoint and one for another endpoint
+    first = QueryEngineClient("http://shared:50051")
+    second = QueryEngineClient("http://shared:50051")
+    other = QueryEngineClient("http://other:50051")
+
+    # When resolving their channels
+    # Then clients for the same endpoint reuse one channel pool
+    assert first.channels is second.channels
+    assert first.channels is not other.channels
+    assert len(first.channels) == 4
+
+
+def test_encode_columns_joins_chunks_per_column():
+    # Given typed column values split across chunks, one of them empty
+    column_chunks = [[[1, 2], ["a", None]], [[], []], [[Decimal("3.5")], ["c"]]]
+
+    # When encoding them as the columns payload
+    payload = orjson.dumps({"columns": _encode_columns(["id", "name"], column_chunks)})
+
+    # Then each column holds every value in order
+    assert orjson.loads(payload) == {"columns": {"id": [1, 2, "3.5"], "name": ["a", None, "c"]}}
+
+
+def test_encode_ndjson_rows_writes_one_line_per_row():
+    # Given typed column values split across two chunks
+    column_chunks = [[[1, 2], ["a", None]], [[3], ["c"]]]
+
+    # When encoding them as NDJSON
+    output = _encode_ndjson_rows(["id", "name"], column_chunks)
+
+    # Then every row is its own JSON line
+    assert output.splitlines() == [
+        '{"id":1,"name":"a"}',
+        '{"id":2,"name":null}',
+        '{"id":3,"name":"c"}',
+    ]
@@ -1,6 +1,6 @@
 use std::net::SocketAddr;
 use std::sync::Arc;
-use tonic::{transport::Server, Request, Response, Status};
+use tonic::{codec::CompressionEncoding, transport::Server, Request, Response, Status};
 use tracing::{error, info};
 
 use crate::engine::AnalysisEngine;
@@ -31,7 +31,11 @@ impl GrpcServer {
         };
 
         Server::builder()
-            .add_service(AnalysisServiceServer::new(analysis_service))
+            .add_service(
+                AnalysisServiceServer::new(analysis_service)
+                    .accept_compressed(CompressionEncoding::Gzip)
+                    .send_compressed(CompressionEncoding::Gzip),
+            )
             .serve(addr)
             .await?;
 
@@ -13,7 +13,7 @@ export interface Dataset {
 }
 
 export interface QueryResult {
-    rows: any[][];
+    columns: Record<string, any[]>;
     column_names: string[];
     total_rows: number;
     execution_time_ms: number;
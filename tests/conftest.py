@@ -0,0 +1,86 @@
+import asyncio
+import os
+import re
+import sys
+from typing import Final
+
+import httpx
+import orjson
+import pytest
+import pytest_asyncio
+
+MCP_ENDPOINT: Final[httpx.URL] = httpx.URL(
+    os.getenv("MCP_SERVER_ENDPOINT", "http://localhost:8080/mcp")
+)
+HEADERS: Final[dict[str, str]] = {
+    "Content-Type": "application/json",
+    "Accept": "application/json, text/event-stream",
+}
+TIMEOUT: Final[httpx.Timeout] = httpx.Timeout(connect=2.0, read=10.0, write=5.0, pool=2.0)
+QUERY_TIMEOUT: Final[httpx.Timeout] = httpx.Timeout(
+    connect=2.0, read=30.0, write=5.0, pool=2.0
+)
+COLD_START_TIMEOUT: Final[httpx.Timeout] = httpx.Timeout(
+    connect=5.0, read=60.0, write=5.0, pool=5.0
+)
+TOOL_CALL: Final[dict[str, object]] = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "tools/call",
+}
+LIST_BODY: Final[bytes] = orjson.dumps(
+    {**TOOL_CALL, "params": {"name": "list_datasets", "arguments": {}}}
+)
+
+if sys.platform == "win32":
+    _LOOP_FACTORIES = {"asyncio": asyncio.new_event_loop}
+else:
+    import uvloop
+
+    _LOOP_FACTORIES = {"uvloop": uvloop.new_event_loop}
+
+_SSE_DATA = re.compile(rb"^data: (.*)$", re.M)
+
+
+def parse_mcp_response(response):
+    match = _SSE_DATA.search(response.content)
+    if match is None:
+        return orjson.loads(response.content)
+    return orjson.loads(match.group(1))
+
+
+def pytest_asyncio_loop_factories(config, item):
+    return _LOOP_FACTORIES
+
+
+@pytest_asyncio.fixture(scope="session")
+async def mcp_client():
+    async with httpx.AsyncClient(
+        http2=True,
+        timeout=TIMEOUT,
+        verify=False,
+        limits=httpx.Limits(max_keepalive_connections=1, keepalive_expiry=30),
+        headers=HEADERS,
+    ) as client:
+        yield client
+
+
+@pytest_asyncio.fixture(scope="session")
+async def _require_mcp(mcp_client):
+    try:
+        await mcp_client.get(MCP_ENDPOINT, timeout=COLD_START_TIMEOUT)
+    except httpx.HTTPError as e:
+        pytest.fail(f"MCP server not reachable at {MCP_ENDPOINT}: {e!r}")
+
+
+@pytest_asyncio.fixture(scope="session")
+async def first_dataset_id(_require_mcp, mcp_client):
+    response = await mcp_client.post(
+        MCP_ENDPOINT, content=LIST_BODY, timeout=COLD_START_TIMEOUT
+    )
+    assert response.status_code == 200
+    result = parse_mcp_response(response)
+    datasets = orjson.loads(result["result"]["content"][0]["text"])
+    if not datasets:
+        pytest.skip("No datasets available")
+    return datasets[0]["id"]
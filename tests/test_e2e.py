@@ -1,127 +1,79 @@
-import pytest
-import httpx
-import json
 import os
 
-@pytest.mark.asyncio
-async def test_mcp_server_flow():
-    mcp_endpoint = os.getenv("MCP_SERVER_ENDPOINT", "http://localhost:8080/mcp")
-
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json, text/event-stream",
-    }
-
-    async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-        list_response = await client.post(
-            mcp_endpoint,
-            headers=headers,
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "tools/call",
-                "params": {"name": "list_datasets", "arguments": {}},
-            },
-        )
-
-        assert list_response.status_code == 200
-
-        response_text = list_response.text
-        if "event: message" in response_text and "data: " in response_text:
-            lines = response_text.split("\n")
-            for line in lines:
-                line = line.strip()
-                if line.startswith("data: "):
-                    json_data = line[6:]
-                    result = json.loads(json_data)
-                    break
-
-        content = result["result"]["content"]
-        datasets = json.loads(content[0]["text"])
-
-        if len(datasets) == 0:
-            pytest.skip("No datasets available to test get_metadata")
+import httpx
+import orjson
+import pytest
 
-        dataset_id = datasets[0]["id"]
+from conftest import MCP_ENDPOINT, QUERY_TIMEOUT, TOOL_CALL, parse_mcp_response
 
-        metadata_response = await client.post(
-            mcp_endpoint,
-            headers=headers,
-            json={
-                "jsonrpc": "2.0",
-                "id": 2,
-                "method": "tools/call",
-                "params": {
-                    "name": "get_metadata",
-                    "arguments": {"params": {"dataset_id": dataset_id}}
-                },
-            },
-        )
+pytestmark = [
+    pytest.mark.e2e,
+    pytest.mark.usefixtures("_require_mcp"),
+    pytest.mark.skipif(
+        "MCP_SERVER_ENDPOINT" not in os.environ,
+        reason="MCP_SERVER_ENDPOINT not set",
+    ),
+]
 
-        assert metadata_response.status_code == 200, (
-            f"Expected 200, got {metadata_response.status_code}: {metadata_response.text}"
-        )
 
-        response_text = metadata_response.text
-        if "event: message" in response_text and "data: " in response_text:
-            lines = response_text.split("\n")
-            for line in lines:
-                line = line.strip()
-                if line.startswith("data: "):
-                    json_data = line[6:]
-                    result = json.loads(json_data)
-                    break
-
-        assert "result" in result
-        content = result["result"]["content"]
-        assert len(content) > 0
+@pytest.fixture
+def args(request, first_dataset_id):
+    return {
+        key: value.format(dataset_id=first_dataset_id) if isinstance(value, str) else value
+        for key, value in request.param.items()
+    }
 
-        metadata = json.loads(content[0]["text"])
-        assert isinstance(metadata, dict) or "error" not in metadata
-        assert "columns" in metadata
-        assert len(metadata["columns"]) > 0
 
-        query_response = await client.post(
-            mcp_endpoint,
-            headers=headers,
-            json={
-                "jsonrpc": "2.0",
-                "id": 3,
-                "method": "tools/call",
-                "params": {
-                    "name": "execute_query",
-                    "arguments": {
-                        "params": {
-                            "dataset_id": dataset_id,
-                            "sql_query": f'SELECT * FROM "{dataset_id}" LIMIT 5',
-                            "limit": 5
-                        }
-                    }
-                },
+@pytest.mark.parametrize(
+    ("tool", "args", "expected_keys"),
+    [
+        pytest.param("list_datasets", {}, (), id="list_datasets"),
+        pytest.param(
+            "get_metadata",
+            {"dataset_id": "{dataset_id}"},
+            ("columns",),
+            id="get_metadata",
+        ),
+        pytest.param(
+            "execute_query",
+            {
+                "dataset_id": "{dataset_id}",
+                "sql_query": 'SELECT * FROM "{dataset_id}" LIMIT 5',
+                "limit": 5,
             },
-        )
-
-        assert query_response.status_code == 200, (
-            f"Expected 200, got {query_response.status_code}: {query_response.text}"
-        )
-
-        response_text = query_response.text
-        if "event: message" in response_text and "data: " in response_text:
-            lines = response_text.split("\n")
-            for line in lines:
-                line = line.strip()
-                if line.startswith("data: "):
-                    json_data = line[6:]
-                    result = json.loads(json_data)
-                    break
-
-        assert "result" in result
-        content = result["result"]["content"]
-        assert len(content) > 0
-
-        query_result = json.loads(content[0]["text"])
-        assert "error" not in query_result or query_result.get("error") is None
-        assert "rows" in query_result
-        assert len(query_result["rows"]) > 0
-        assert "column_names" in query_result
-        assert len(query_result["column_names"]) > 0
+            ("columns", "column_names"),
+            id="execute_query",
+        ),
+    ],
+    indirect=["args"],
+)
+async def test_tool_call(mcp_client, tool, args, expected_keys):
+    # Given a running MCP server with at least one dataset
+    arguments = {"params": args} if args else {}
+
+    # When the tool is called
+    response = await mcp_client.post(
+        MCP_ENDPOINT,
+        content=orjson.dumps(
+            {**TOOL_CALL, "params": {"name": tool, "arguments": arguments}}
+        ),
+        timeout=QUERY_TIMEOUT if tool == "execute_query" else httpx.USE_CLIENT_DEFAULT,
+    )
+
+    # Then the tool returns a non-empty result without an error
+    assert response.status_code == 200, (
+        f"Expected 200, got {response.status_code}: {response.text}"
+    )
+    result = parse_mcp_response(response)
+    assert "result" in result
+    content = result["result"]["content"]
+    assert len(content) > 0
+
+    body = orjson.loads(content[0]["text"])
+    assert len(body) > 0
+    assert "error" not in body
+    for key in expected_keys:
+        assert len(body[key]) > 0
+    if tool == "execute_query":
+        assert body["total_rows"] > 0
+        assert all(len(values) == body["total_rows"] for values in body["columns"].values())